@@ -13,13 +13,45 @@ streamlit_app.py
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import io
 import json
-import tempfile
-from pathlib import Path
+import threading
 from typing import Any, Dict, Optional
 
 import streamlit as st
 
+# orjson 序列化更快且原生输出 UTF-8；未安装时退回标准库
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+@st.cache_resource(show_spinner=False)
+def _get_llm_loop() -> asyncio.AbstractEventLoop:
+    """进程级常驻事件循环（后台线程驱动），所有 LLM 协程都跑在它上面。
+
+    AsyncOpenAI / httpx 的连接池绑定在创建它的事件循环上：如果每次点击
+    都用 asyncio.run 新开一个临时 loop，旧 loop 关闭后复用 keep-alive
+    连接会抛 RuntimeError: Event loop is closed，连接池就形同虚设。
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+    return loop
+
+
+def _run_async(coro):
+    """在常驻事件循环上同步执行协程并返回结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_llm_loop()).result()
+
 
 def _safe_import_resume_parser():
     try:
@@ -37,80 +69,109 @@ def _safe_import_ai_advisor():
         return e
 
 
-def _extract_text_from_pdf(uploaded_file) -> str:
+# 导入检查只在模块层做一次：Streamlit 每次交互都会整脚本重跑，
+# 各个函数里反复走 try/except 导入机制在热路径上是纯浪费。
+# 值要么是模块对象，要么是导入时抛出的异常对象。
+_RESUME_PARSER = _safe_import_resume_parser()
+_AI_ADVISOR = _safe_import_ai_advisor()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _extract_text_from_pdf(file_bytes: bytes, name: str) -> str:
     """
-    兼容两种实现：
+    从 PDF 字节流提取文本。
+
+    st.cache_data 以 file_bytes 内容为键：Streamlit 任意控件交互都会
+    整脚本重跑，同一份文件不会被重复解析（跨会话也能命中）。
     - 若项目现有 `resume_parser.extract_text_from_pdf` 可用，则优先调用
-      - 如果它只能接受路径：会先落盘为临时文件再调用
-      - 如果它能接受 file-like：直接传入
-    - 否则使用内置兜底（pypdf）从 UploadedFile bytes 中提取
+    - 否则使用内置兜底（pypdf）直接从 bytes 中提取
     """
-    resume_parser = _safe_import_resume_parser()
+    resume_parser = _RESUME_PARSER
 
-    # 1) 复用项目实现（如果存在）
+    # 1) 复用项目实现（如果存在）：解析器直接接受 bytes
     if not isinstance(resume_parser, Exception) and hasattr(resume_parser, "extract_text_from_pdf"):
         fn = getattr(resume_parser, "extract_text_from_pdf")
-        # 1.1) 先尝试直接传 UploadedFile
-        try:
-            return fn(uploaded_file) or ""
-        except Exception:
-            # 1.2) 不支持 UploadedFile：保存到临时文件路径再调用
-            suffix = Path(uploaded_file.name).suffix or ".pdf"
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(uploaded_file.getvalue())
-                tmp_path = tmp.name
-            return fn(tmp_path) or ""
-
-    # 2) 内置兜底：pypdf
-    try:
-        from pypdf import PdfReader  # type: ignore
-
-        reader = PdfReader(uploaded_file)
-        full_text = ""
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                full_text += text + "\n"
-        return full_text
-    except Exception:
-        # 进一步兜底：保存成临时文件再用 PdfReader(path)
-        from pypdf import PdfReader  # type: ignore
-
-        suffix = Path(uploaded_file.name).suffix or ".pdf"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(uploaded_file.getvalue())
-            tmp_path = tmp.name
-        reader = PdfReader(tmp_path)
-        full_text = ""
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                full_text += text + "\n"
-        return full_text
+        return fn(file_bytes) or ""
+
+    # 2) 内置兜底：pypdf 直接读内存流，全程不落盘
+    from pypdf import PdfReader  # type: ignore
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    parts = []
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            parts.append(text)
+    return "\n".join(parts)
+
+
+def _text_cache_key(text: str) -> str:
+    """会话级缓存键：对文本取短哈希，避免把大段简历文本本身当 dict key"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _analysis_error_result(e: Exception) -> Dict[str, Any]:
+    """诊断调用失败时的可展示结果（不会进缓存，允许用户修好配置后重试）"""
+    return {
+        "score": 0,
+        "summary": "AI 诊断模块当前不可用（调用失败）。",
+        "error": str(e),
+        "suggestions": [
+            {"advice": "请检查 .env 是否配置 DEEPSEEK_API_KEY", "evidence": "环境变量缺失会导致调用失败"},
+            {"advice": "确认 openai/python-dotenv 版本与代码兼容", "evidence": "依赖版本不一致可能导致 API 调用异常"},
+        ],
+        "matched_jobs": [],
+    }
 
 
 def _ai_analyze(resume_text: str) -> Dict[str, Any]:
     """
-    优先调用项目的 ai_advisor.analyze_resume。
+    优先调用项目的 ai_advisor.analyze_and_rewrite（一次请求同时产出
+    诊断与重写），退化时调用 analyze_resume。
+    同一份简历文本（按哈希判断）命中会话级缓存时直接返回，
+    不再重复调用 DeepSeek（也避免误触双击重复扣费）。
     若不可用/报错，则返回一个可展示的 mock 结果，保证页面可用。
     """
-    ai_advisor = _safe_import_ai_advisor()
+    cache = st.session_state.setdefault("analysis_cache", {})
+    rewrite_cache = st.session_state.setdefault("rewrite_cache", {})
+    key = _text_cache_key(resume_text)
+    if key in cache:
+        st.session_state.prefetched_markdown = rewrite_cache.get(key, "")
+        return cache[key]
+
+    # 缓存未命中：先清掉上一份简历暂存的重写稿——若本次诊断失败，
+    # "立即生成"绝不能把前一份简历的内容当成这一份的结果端出来
+    st.session_state.prefetched_markdown = ""
+
+    ai_advisor = _AI_ADVISOR
+    if not isinstance(ai_advisor, Exception) and hasattr(ai_advisor, "analyze_and_rewrite"):
+        try:
+            # 融合调用：一次请求同时拿到诊断 JSON 和重写后的 Markdown，
+            # 省掉"立即生成"按钮的第二次往返（协程同步驱动）
+            result = _run_async(ai_advisor.analyze_and_rewrite(resume_text))
+            if isinstance(result, dict):
+                markdown = (result.pop("rewritten_markdown", "") or "").strip()
+                rewrite_cache[key] = markdown
+                st.session_state.prefetched_markdown = markdown
+                cache[key] = result
+                return result
+            # 返回 None 说明调用失败且内部已兜掉异常（详见日志）：
+            # 重试已经在底层做过了，不再降级去 analyze_resume 又跑一整轮
+            # 超时 × 重试，直接走错误展示
+            return _analysis_error_result(RuntimeError("analyze_and_rewrite 调用失败，请查看服务端日志"))
+        except Exception as e:
+            return _analysis_error_result(e)
+
+    # 退化：旧版 ai_advisor 没有 analyze_and_rewrite，只有单独的 analyze_resume
     if not isinstance(ai_advisor, Exception) and hasattr(ai_advisor, "analyze_resume"):
         try:
-            result = ai_advisor.analyze_resume(resume_text)
+            result = _run_async(ai_advisor.analyze_resume(resume_text))
             if isinstance(result, dict):
+                st.session_state.prefetched_markdown = ""
+                cache[key] = result
                 return result
         except Exception as e:
-            return {
-                "score": 0,
-                "summary": "AI 诊断模块当前不可用（调用失败）。",
-                "error": str(e),
-                "suggestions": [
-                    {"advice": "请检查 .env 是否配置 DEEPSEEK_API_KEY", "evidence": "环境变量缺失会导致调用失败"},
-                    {"advice": "确认 openai/python-dotenv 版本与代码兼容", "evidence": "依赖版本不一致可能导致 API 调用异常"},
-                ],
-                "matched_jobs": [],
-            }
+            return _analysis_error_result(e)
 
     # mock 兜底
     return {
@@ -130,10 +191,10 @@ def _ai_generate_resume_markdown(prompt: str) -> str:
     优先调用项目 ai_advisor.generate_resume_markdown。
     不可用则返回一个可下载的 Demo Markdown。
     """
-    ai_advisor = _safe_import_ai_advisor()
+    ai_advisor = _AI_ADVISOR
     if not isinstance(ai_advisor, Exception) and hasattr(ai_advisor, "generate_resume_markdown"):
         try:
-            out = ai_advisor.generate_resume_markdown(prompt)
+            out = _run_async(ai_advisor.generate_resume_markdown(prompt))
             if isinstance(out, str) and out.strip():
                 return out.strip()
         except Exception as e:
@@ -147,6 +208,58 @@ def _ai_generate_resume_markdown(prompt: str) -> str:
     )
 
 
+def _iter_async_gen(agen):
+    """把异步生成器桥接为同步生成器（逐项提交到常驻 loop），供 st.write_stream 消费"""
+    while True:
+        try:
+            yield _run_async(agen.__anext__())
+        except StopAsyncIteration:
+            break
+
+
+def _ai_generate_resume_markdown_stream(prompt: str):
+    """
+    流式版本：逐 token yield 给 st.write_stream 渲染，
+    同时把完整文本累积进 session_state 供后续下载。
+    相同 prompt 命中会话级缓存时直接返回上次结果，不再调用 LLM。
+    不支持流式时回退到一次性生成。
+    中途失败通过 st.session_state.generation_failed 通知调用方。
+    """
+    st.session_state.generation_failed = False
+    cache = st.session_state.setdefault("generation_cache", {})
+    key = _text_cache_key(prompt)
+    if key in cache:
+        st.session_state.optimized_markdown = cache[key]
+        yield cache[key]
+        return
+
+    ai_advisor = _AI_ADVISOR
+    st.session_state.optimized_markdown = ""
+
+    if not isinstance(ai_advisor, Exception) and hasattr(ai_advisor, "generate_resume_markdown_stream"):
+        try:
+            for token in _iter_async_gen(ai_advisor.generate_resume_markdown_stream(prompt)):
+                st.session_state.optimized_markdown += token
+                yield token
+        except Exception as e:
+            # 中途失败（可能已流出部分内容）：提示用户但绝不进缓存，
+            # 下次点击同样的 prompt 会重新调用而不是复用半截结果
+            st.session_state.generation_failed = True
+            msg = f"\n\n> ⚠️ AI 生成服务中断: {e}，请重试。"
+            st.session_state.optimized_markdown += msg
+            yield msg
+            return
+        full = st.session_state.optimized_markdown
+        if full:
+            cache[key] = full
+        return
+
+    # 兜底：一次性生成
+    out = _ai_generate_resume_markdown(prompt)
+    st.session_state.optimized_markdown = out
+    yield out
+
+
 def _init_state():
     if "analysis_result" not in st.session_state:
         st.session_state.analysis_result = None
@@ -154,6 +267,10 @@ def _init_state():
         st.session_state.resume_text = ""
     if "optimized_markdown" not in st.session_state:
         st.session_state.optimized_markdown = ""
+    if "prefetched_markdown" not in st.session_state:
+        st.session_state.prefetched_markdown = ""
+    if "generation_failed" not in st.session_state:
+        st.session_state.generation_failed = False
 
 
 def main():
@@ -167,8 +284,8 @@ def main():
         st.info("💡 若分析/生成结果不完整，请查看页面中的【原始数据调试】。")
 
         st.subheader("运行环境自检")
-        rp = _safe_import_resume_parser()
-        aa = _safe_import_ai_advisor()
+        rp = _RESUME_PARSER
+        aa = _AI_ADVISOR
         st.write("- resume_parser:", "✅ 可导入" if not isinstance(rp, Exception) else f"⚠️ 导入失败：{rp}")
         st.write("- ai_advisor:", "✅ 可导入" if not isinstance(aa, Exception) else f"⚠️ 导入失败：{aa}")
 
@@ -185,19 +302,23 @@ def main():
     st.success(f"✅ 已上传: {uploaded_file.name}")
 
     if st.button("开始诊断 🚀"):
-        st.write("🔄 正在读取 PDF...")
-        try:
-            resume_text = _extract_text_from_pdf(uploaded_file)
-            st.session_state.resume_text = resume_text
-            st.write(f"📄 提取到字符数: {len(resume_text)}")
-        except Exception as e:
-            st.error(f"💥 读取 PDF 失败: {e}")
-            st.exception(e)
-            st.stop()
-
-        st.write("🧠 正在呼叫 AI 大脑...")
-        result = _ai_analyze(st.session_state.resume_text)
-        st.session_state.analysis_result = result
+        # 进度统一放在 st.status 里展示（库模块只写日志，不再 print）
+        with st.status("🩺 正在诊断...", expanded=True) as status:
+            st.write("🔄 正在读取 PDF...")
+            try:
+                resume_text = _extract_text_from_pdf(uploaded_file.getvalue(), uploaded_file.name)
+                st.session_state.resume_text = resume_text
+                st.write(f"📄 提取到字符数: {len(resume_text)}")
+            except Exception as e:
+                status.update(label="💥 读取 PDF 失败", state="error")
+                st.error(f"💥 读取 PDF 失败: {e}")
+                st.exception(e)
+                st.stop()
+
+            st.write("🧠 正在呼叫 AI 大脑...")
+            result = _ai_analyze(st.session_state.resume_text)
+            st.session_state.analysis_result = result
+            status.update(label="✅ 诊断完成", state="complete", expanded=False)
 
     if not st.session_state.analysis_result:
         st.stop()
@@ -252,7 +373,11 @@ def main():
     st.write("AI 将根据上述诊断建议，为你重写一份 Markdown 格式的简历。")
 
     if st.button("⚡ 立即生成优化版简历"):
-        with st.spinner("✍️ AI 正在重写简历，请稍候..."):
+        if st.session_state.prefetched_markdown:
+            # 诊断时已在同一次请求里生成好，直接展示，零额外延迟
+            st.session_state.optimized_markdown = st.session_state.prefetched_markdown
+            st.success("🎉 生成完成！")
+        else:
             prompt = f"""
 请根据以下原始简历内容和修改建议，重写一份优化后的简历。
 
@@ -260,16 +385,19 @@ def main():
 {st.session_state.resume_text[:2000]}
 
 【修改建议】：
-{json.dumps(analysis_result.get('suggestions', []), ensure_ascii=False)}
+{_json_dumps(analysis_result.get('suggestions', []))}
 
 要求：
 1. 使用标准 Markdown 格式。
 2. 针对建议点进行具体修改。
 3. 优化语言表达，使其更专业。
 """
-            optimized_content = _ai_generate_resume_markdown(prompt)
-            st.session_state.optimized_markdown = optimized_content
-            st.success("🎉 生成完成！")
+            # 流式渲染：token 一边到达一边显示，完整文本同步累积进 session_state
+            st.write_stream(_ai_generate_resume_markdown_stream(prompt))
+            if st.session_state.get("generation_failed"):
+                st.warning("⚠️ 生成未完成，请重试。")
+            else:
+                st.success("🎉 生成完成！")
 
     if st.session_state.optimized_markdown:
         st.text_area("Markdown 源码预览", value=st.session_state.optimized_markdown, height=300)